@@ -0,0 +1,33 @@
+import argparse
+import os
+import orjson
+
+def convert_to_ndjson(input_file, output_file=None):
+    """
+    将 JSON 数组格式的K线/训练数据文件转换为行分隔 JSON（NDJSON，每行一条记录）。
+
+    :param input_file: JSON 数组文件路径
+    :param output_file: 输出文件路径，默认与输入文件同名、扩展名为 .jsonl
+    :return: 输出文件路径
+    """
+    if output_file is None:
+        output_file = os.path.splitext(input_file)[0] + '.jsonl'
+
+    with open(input_file, 'rb') as f:
+        records = orjson.loads(f.read())
+
+    with open(output_file, 'wb') as f_out:
+        for record in records:
+            f_out.write(orjson.dumps(record))
+            f_out.write(b'\n')
+
+    print(f"已将 {len(records)} 条记录从 {input_file} 转换到 {output_file}")
+    return output_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='将 JSON 数组文件转换为行分隔 JSON（.jsonl）')
+    parser.add_argument('input_files', nargs='+', help='要转换的 JSON 文件路径')
+    args = parser.parse_args()
+
+    for input_file in args.input_files:
+        convert_to_ndjson(input_file)
@@ -0,0 +1,382 @@
+import os
+import sys
+import numpy as np
+
+# 编译结果缓存到模块旁的固定目录（可用环境变量 NUMBA_CACHE_DIR 覆盖），多个进程和多次运行共用同一份缓存，
+# 必须在导入 numba 之前设置
+os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.numba_cache'))
+
+# 公共的 numba 兼容模块位于仓库根目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from numba_compat import njit
+
+
+# compute_all 输出数组中各列对应的指标名称（顺序与输出列一致）
+INDICATOR_COLUMNS = [
+    'MA7', 'MA25', 'MA99',
+    'ATR50', 'MA50', 'Keltner_Upper', 'Keltner_Lower',
+    'RSI',
+    'MACD', 'MACD_Signal', 'MACD_Hist',
+    'Bollinger_High', 'Bollinger_Low', 'Bollinger_Middle',
+    'Stochastic_%K', 'Stochastic_%D',
+    'ADX', 'ADX_PDI', 'ADX_MDI',
+    'Williams_%R',
+    'CMF',
+    'MFI',
+    'EMA12', 'EMA26',
+]
+
+# 肯特纳通道的 ATR 倍数
+KELTNER_MULTIPLIER = 2.75
+
+
+@njit(cache=True, error_model='numpy')
+def _cumsum(arr):
+    """前缀和，长度为 N+1，首元素为 0，供多个窗口的简单移动平均共用。"""
+    out = np.empty(len(arr) + 1)
+    out[0] = 0.0
+    for i in range(len(arr)):
+        out[i + 1] = out[i] + arr[i]
+    return out
+
+
+@njit(cache=True, error_model='numpy')
+def _sma(cumsum, w, out):
+    """由前缀和计算简单移动平均，前 w-1 个值为 NaN（与 rolling(w).mean() 一致）。"""
+    n = len(cumsum) - 1
+    for i in range(n):
+        if i >= w - 1:
+            out[i] = (cumsum[i + 1] - cumsum[i + 1 - w]) / w
+        else:
+            out[i] = np.nan
+
+
+@njit(cache=True, error_model='numpy')
+def _ewm(arr, alpha, min_periods, out):
+    """指数加权平均（adjust=False），从第一个非 NaN 值开始递推，有效值不足 min_periods 个时为 NaN。"""
+    n = len(arr)
+    start = 0
+    while start < n and np.isnan(arr[start]):
+        out[start] = np.nan
+        start += 1
+    if start == n:
+        return
+    value = arr[start]
+    for i in range(start, n):
+        if i > start:
+            value = alpha * arr[i] + (1.0 - alpha) * value
+        if i - start >= min_periods - 1:
+            out[i] = value
+        else:
+            out[i] = np.nan
+
+
+@njit(cache=True, error_model='numpy')
+def _ema(arr, w, out):
+    """指数移动平均（span=w），前 w-1 个有效值为 NaN。"""
+    _ewm(arr, 2.0 / (w + 1), w, out)
+
+
+@njit(cache=True, error_model='numpy')
+def _atr(high, low, close, w, out):
+    """平均真实波幅（Wilder 平滑），前 w-1 个值为 0（与 ta 库一致）。"""
+    n = len(close)
+    tr = np.empty(n)
+    tr[0] = high[0] - low[0]
+    for i in range(1, n):
+        tr[i] = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+    out[:] = 0.0
+    if n < w:
+        return
+    out[w - 1] = tr[:w].mean()
+    for i in range(w, n):
+        out[i] = (out[i - 1] * (w - 1) + tr[i]) / w
+
+
+@njit(cache=True, error_model='numpy')
+def _rsi(close, w, out):
+    """相对强弱指数，涨跌幅使用 Wilder 平滑（alpha=1/w）。"""
+    n = len(close)
+    gain = np.zeros(n)
+    loss = np.zeros(n)
+    for i in range(1, n):
+        diff = close[i] - close[i - 1]
+        if diff > 0:
+            gain[i] = diff
+        elif diff < 0:
+            loss[i] = -diff
+    gain_avg = np.empty(n)
+    loss_avg = np.empty(n)
+    _ewm(gain, 1.0 / w, w, gain_avg)
+    _ewm(loss, 1.0 / w, w, loss_avg)
+    for i in range(n):
+        if loss_avg[i] == 0:
+            out[i] = 100.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + gain_avg[i] / loss_avg[i])
+
+
+@njit(cache=True, error_model='numpy')
+def _macd(close, fast, slow, sign, macd, signal, hist):
+    """MACD 线、信号线和柱状图。"""
+    n = len(close)
+    ema_fast = np.empty(n)
+    ema_slow = np.empty(n)
+    _ema(close, fast, ema_fast)
+    _ema(close, slow, ema_slow)
+    for i in range(n):
+        macd[i] = ema_fast[i] - ema_slow[i]
+    _ema(macd, sign, signal)
+    for i in range(n):
+        hist[i] = macd[i] - signal[i]
+
+
+@njit(cache=True, error_model='numpy')
+def _bb(close, cumsum, w, dev, high_band, low_band, middle):
+    """布林带（总体标准差 ddof=0），中轨由收盘价前缀和计算。"""
+    n = len(close)
+    _sma(cumsum, w, middle)
+    for i in range(n):
+        if i < w - 1:
+            high_band[i] = np.nan
+            low_band[i] = np.nan
+            continue
+        mean = middle[i]
+        var = 0.0
+        for j in range(i - w + 1, i + 1):
+            var += (close[j] - mean) ** 2
+        std = np.sqrt(var / w)
+        high_band[i] = mean + dev * std
+        low_band[i] = mean - dev * std
+
+
+@njit(cache=True, error_model='numpy')
+def _stoch(high, low, close, w, smooth, k, d):
+    """随机指标 %K 及其 smooth 期简单平均 %D。"""
+    n = len(close)
+    for i in range(n):
+        if i < w - 1:
+            k[i] = np.nan
+            continue
+        lowest = low[i]
+        highest = high[i]
+        for j in range(i - w + 1, i):
+            lowest = min(lowest, low[j])
+            highest = max(highest, high[j])
+        k[i] = 100.0 * (close[i] - lowest) / (highest - lowest)
+    # %K 可能含 NaN/inf，逐窗口求和以避免累计误差传播
+    for i in range(n):
+        if i < smooth - 1:
+            d[i] = np.nan
+            continue
+        total = 0.0
+        for j in range(i - smooth + 1, i + 1):
+            total += k[j]
+        d[i] = total / smooth
+
+
+@njit(cache=True, error_model='numpy')
+def _adx(high, low, close, w, adx, pdi, mdi):
+    """平均方向性指数及 +DI/-DI，逐步复现 ta 库的计算方式（包括其下标偏移）。"""
+    n = len(close)
+    adx[:] = 0.0
+    pdi[:] = 0.0
+    mdi[:] = 0.0
+    m = n - (w - 1)
+    if m <= w:
+        return
+
+    tr = np.zeros(n)
+    pos = np.zeros(n)
+    neg = np.zeros(n)
+    for i in range(1, n):
+        tr[i] = max(high[i], close[i - 1]) - min(low[i], close[i - 1])
+        up = high[i] - high[i - 1]
+        down = low[i - 1] - low[i]
+        if up > down and up > 0:
+            pos[i] = up
+        if down > up and down > 0:
+            neg[i] = down
+
+    trs = np.zeros(m)
+    dip = np.zeros(m)
+    din = np.zeros(m)
+    trs[0] = tr[1:w + 1].sum()
+    dip[0] = pos[1:w + 1].sum()
+    din[0] = neg[1:w + 1].sum()
+    for i in range(1, m - 1):
+        trs[i] = trs[i - 1] - trs[i - 1] / w + tr[w + i]
+        dip[i] = dip[i - 1] - dip[i - 1] / w + pos[w + i]
+        din[i] = din[i - 1] - din[i - 1] / w + neg[w + i]
+
+    dx = np.zeros(m)
+    for i in range(m):
+        if trs[i] != 0:
+            p = 100.0 * dip[i] / trs[i]
+            q = 100.0 * din[i] / trs[i]
+            if p + q != 0:
+                dx[i] = 100.0 * abs((p - q) / (p + q))
+        if 1 <= i < m - 1 and trs[i] != 0:
+            pdi[i + w] = 100.0 * dip[i] / trs[i]
+            mdi[i + w] = 100.0 * din[i] / trs[i]
+
+    value = dx[:w].mean()
+    adx[2 * w - 1] = value
+    for i in range(w + 1, m):
+        value = (value * (w - 1) + dx[i - 1]) / w
+        adx[i + w - 1] = value
+
+
+@njit(cache=True, error_model='numpy')
+def _willr(high, low, close, w, out):
+    """威廉指标 %R。"""
+    n = len(close)
+    for i in range(n):
+        if i < w - 1:
+            out[i] = np.nan
+            continue
+        lowest = low[i]
+        highest = high[i]
+        for j in range(i - w + 1, i):
+            lowest = min(lowest, low[j])
+            highest = max(highest, high[j])
+        out[i] = -100.0 * (highest - close[i]) / (highest - lowest)
+
+
+@njit(cache=True, error_model='numpy')
+def _cmf(high, low, close, volume, w, out):
+    """蔡金资金流量指标。"""
+    n = len(close)
+    mfv = np.empty(n)
+    for i in range(n):
+        ratio = ((close[i] - low[i]) - (high[i] - close[i])) / (high[i] - low[i])
+        if np.isnan(ratio):
+            ratio = 0.0
+        mfv[i] = ratio * volume[i]
+    mfv_sum = 0.0
+    volume_sum = 0.0
+    for i in range(n):
+        mfv_sum += mfv[i]
+        volume_sum += volume[i]
+        if i >= w:
+            mfv_sum -= mfv[i - w]
+            volume_sum -= volume[i - w]
+        if i >= w - 1:
+            out[i] = mfv_sum / volume_sum
+        else:
+            out[i] = np.nan
+
+
+@njit(cache=True, error_model='numpy')
+def _mfi(high, low, close, volume, w, out):
+    """资金流向指标。"""
+    n = len(close)
+    flow = np.empty(n)
+    prev_tp = np.nan
+    for i in range(n):
+        tp = (high[i] + low[i] + close[i]) / 3.0
+        if tp > prev_tp:
+            flow[i] = tp * volume[i]
+        elif tp < prev_tp:
+            flow[i] = -tp * volume[i]
+        else:
+            flow[i] = 0.0
+        prev_tp = tp
+    for i in range(n):
+        if i < w - 1:
+            out[i] = np.nan
+            continue
+        positive = 0.0
+        negative = 0.0
+        for j in range(i - w + 1, i + 1):
+            if flow[j] >= 0.0:
+                positive += flow[j]
+            else:
+                negative -= flow[j]
+        out[i] = 100.0 - 100.0 / (1.0 + positive / negative)
+
+
+@njit(cache=True, error_model='numpy')
+def _fill_indicators(high, low, close, volume, out):
+    """依次调用各指标内核，将结果写入 out 的对应列（列顺序见 INDICATOR_COLUMNS）。"""
+    # 所有简单移动平均共用同一次前缀和
+    cumsum = _cumsum(close)
+    _sma(cumsum, 7, out[:, 0])
+    _sma(cumsum, 25, out[:, 1])
+    _sma(cumsum, 99, out[:, 2])
+
+    _atr(high, low, close, 50, out[:, 3])
+    _sma(cumsum, 50, out[:, 4])
+    for i in range(len(close)):
+        out[i, 5] = out[i, 4] + KELTNER_MULTIPLIER * out[i, 3]
+        out[i, 6] = out[i, 4] - KELTNER_MULTIPLIER * out[i, 3]
+
+    _rsi(close, 14, out[:, 7])
+    _macd(close, 12, 26, 9, out[:, 8], out[:, 9], out[:, 10])
+    _bb(close, cumsum, 20, 2.0, out[:, 11], out[:, 12], out[:, 13])
+    _stoch(high, low, close, 14, 3, out[:, 14], out[:, 15])
+    _adx(high, low, close, 14, out[:, 16], out[:, 17], out[:, 18])
+    _willr(high, low, close, 14, out[:, 19])
+    _cmf(high, low, close, volume, 20, out[:, 20])
+    _mfi(high, low, close, volume, 14, out[:, 21])
+
+    _ema(close, 12, out[:, 22])
+    _ema(close, 26, out[:, 23])
+
+
+@njit(cache=True, error_model='numpy')
+def _fill_segments(high, low, close, volume, starts, ends, out):
+    """逐段计算指标，每段从头开始递推，段与段之间不共享任何状态。"""
+    for k in range(len(starts)):
+        s = starts[k]
+        e = ends[k]
+        _fill_indicators(high[s:e], low[s:e], close[s:e], volume[s:e], out[s:e])
+
+
+def compute_segments(high, low, close, volume, starts, ends):
+    """
+    对多个连续时间段一次性计算全部技术指标，各段的指标在段边界处重新开始计算。
+
+    :param high: 最高价数组
+    :param low: 最低价数组
+    :param close: 收盘价数组
+    :param volume: 成交量数组
+    :param starts: 各段的起始下标
+    :param ends: 各段的结束下标（不含）
+    :return: 形状为 (N, len(INDICATOR_COLUMNS)) 的 float64 数组，列顺序见 INDICATOR_COLUMNS，不属于任何段的行为 NaN
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    volume = np.ascontiguousarray(volume, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    out = np.full((len(close), len(INDICATOR_COLUMNS)), np.nan, order='F')
+    _fill_segments(high, low, close, volume, starts, ends, out)
+    return out
+
+
+def compute_all(high, low, close, volume):
+    """
+    一次性计算全部技术指标。
+
+    :param high: 最高价数组
+    :param low: 最低价数组
+    :param close: 收盘价数组
+    :param volume: 成交量数组
+    :return: 形状为 (N, len(INDICATOR_COLUMNS)) 的 float64 数组，列顺序见 INDICATOR_COLUMNS
+    """
+    return compute_segments(high, low, close, volume, [0], [len(close)])
+
+
+def warmup():
+    """
+    用少量数据调用一次全部内核，触发编译并写入磁盘缓存，之后的进程直接加载缓存，不再 JIT 编译。
+    """
+    values = np.linspace(1.0, 2.0, 128)
+    compute_all(values + 0.5, values - 0.5, values, values)
+
+
+if __name__ == "__main__":
+    # 预先编译：python indicators_numba.py
+    warmup()
@@ -1,162 +1,156 @@
+import numpy as np
 import pandas as pd
-import json
-from datetime import datetime, timedelta
+import orjson
 import os
-from ta import trend, momentum, volatility, volume
+import sys
+import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from joblib import Parallel, delayed
+from indicators_numba import compute_segments, warmup, INDICATOR_COLUMNS
 
-def process_crypto_data(input_file, output_dir_separate, output_file_combined):
+# 公共的 K 线工具模块位于仓库根目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from kline_utils import records_to_frame
+
+def _process_segment(idx, seg, seg_open_ms, output_dir_separate, as_json):
+    """
+    保存单个已计算指标的时间段。
+
+    :param idx: 段序号（从 0 开始）
+    :param seg: 已去掉前99个数据点的段 DataFrame
+    :param seg_open_ms: 该段 open_time 的毫秒时间戳数组
+    :param output_dir_separate: 单独段文件的输出目录
+    :param as_json: 是否以 JSON 格式输出
+    :return: (段文件路径, 记录数, 用于合并输出的段数据)
+    """
+    if as_json:
+        # 将处理后的段转换为字典列表（时间列仍是原始字符串，可直接序列化）
+        processed_data = seg.to_dict(orient='records')
+        
+        # 保存为单独的 JSON 文件
+        segment_filename = os.path.join(output_dir_separate, f'segment_{idx+1}.json')
+        with open(segment_filename, 'wb') as f_out:
+            f_out.write(orjson.dumps(processed_data, option=orjson.OPT_INDENT_2))
+        
+        # 为合并输出，包含每个段的信息
+        return segment_filename, len(seg), {
+            "segment_id": idx+1,
+            "start_time": seg['open_time'].iloc[0],
+            "end_time": seg['close_time'].iloc[-1],
+            "records": processed_data
+        }
+    
+    # Parquet 中时间列以 datetime 类型保存，只转换保留下来的行；两列统一为毫秒精度，
+    # 否则字符串解析出的 close_time 精度随 pandas 版本变化，与 open_time 不一致
+    seg = seg.assign(open_time=pd.to_datetime(seg_open_ms, unit='ms'),
+                     close_time=pd.to_datetime(seg['close_time'], format='%Y-%m-%d %H:%M:%S').astype('datetime64[ms]'))
+    
+    # 保存为单独的 Parquet 文件
+    segment_filename = os.path.join(output_dir_separate, f'segment_{idx+1}.parquet')
+    seg.to_parquet(segment_filename, compression='snappy', index=False)
+    
+    # 为合并输出，用 segment_id 列标记每条记录所属的段
+    return segment_filename, len(seg), seg.assign(segment_id=idx+1)
+
+def process_crypto_data(input_file, output_dir_separate, output_file_combined, as_json=False, n_jobs=1):
     # 设置日志配置
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
-    # 创建输出目录（用于保存单独的 JSON 文件）
+    # 创建输出目录（用于保存单独的段文件）
     os.makedirs(output_dir_separate, exist_ok=True)
     
     # 从输入文件加载 JSON 数据
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(input_file, 'rb') as f:
+        data = orjson.loads(f.read())
     
-    # 将字典列表转换为 pandas DataFrame
-    df = pd.DataFrame(data)
+    # 将字典列表按列转换为 pandas DataFrame
+    df = records_to_frame(data)
+    del data
     
-    # 将 'open_time' 和 'close_time' 转换为 datetime 对象
-    df['open_time'] = pd.to_datetime(df['open_time'], format='%Y-%m-%d %H:%M:%S')
-    df['close_time'] = pd.to_datetime(df['close_time'], format='%Y-%m-%d %H:%M:%S')
+    # 将 'open_time' 解析为 int64 毫秒时间戳，时间字符串列本身保持不变，输出 JSON 时直接复用
+    open_ms = np.array(df['open_time'].to_numpy(), dtype='datetime64[ms]').view(np.int64)
     
     # 按 'open_time' 排序以确保时间顺序
-    df.sort_values('open_time', inplace=True)
-    df.reset_index(drop=True, inplace=True)
-    
-    # 初始化用于分割连续时间段的变量
-    segments = []
-    current_segment = [df.iloc[0]]
-    
-    # 遍历 DataFrame，将数据分割成连续的每小时段
-    for i in range(1, len(df)):
-        current_time = df.iloc[i]['open_time']
-        previous_time = df.iloc[i-1]['open_time']
-        if current_time - previous_time == timedelta(hours=1):
-            current_segment.append(df.iloc[i])
-        else:
-            segments.append(pd.DataFrame(current_segment))
-            current_segment = [df.iloc[i]]
-    # 添加最后一个段
-    segments.append(pd.DataFrame(current_segment))
-    
-    logging.info(f"Total segments found: {len(segments)}")
+    order = np.argsort(open_ms, kind='stable')
+    df = df.iloc[order].reset_index(drop=True)
+    open_ms = open_ms[order]
+    
+    # 找出相邻两条记录间隔不为1小时（3600000 毫秒）的位置，作为连续时间段的分割边界
+    boundaries = np.flatnonzero(np.diff(open_ms) != 3_600_000) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(df)]))
+    segment_lengths = ends - starts
+    logging.info(f"Total segments found: {len(starts)}")
+    
+    # 检查并填补缺失值（只在各段内部向前/向后填充）
+    segment_ids = np.repeat(np.arange(len(starts)), segment_lengths)
+    null_rows = df.isnull().to_numpy().any(axis=1)
+    if null_rows.any():
+        for idx in np.unique(segment_ids[null_rows]):
+            if segment_lengths[idx] >= 99:
+                logging.warning(f"Segment {idx+1} contains missing values. Filling forward.")
+        df = df.groupby(segment_ids).ffill().groupby(segment_ids).bfill()
+    
+    # 对所有足够长的段一次性计算技术指标（MA、肯特纳通道、RSI、MACD、布林带、随机指标、ADX、威廉指标、CMF、MFI、EMA），
+    # 各段的指标在段边界处重新开始计算
+    long_enough = segment_lengths >= 99
+    indicators = compute_segments(df['high_price'].to_numpy(), df['low_price'].to_numpy(),
+                                  df['close_price'].to_numpy(), df['volume'].to_numpy(),
+                                  starts[long_enough], ends[long_enough])
+    df = pd.concat([df, pd.DataFrame(indicators, columns=INDICATOR_COLUMNS, index=df.index)], axis=1)
+    
+    # 段长度不足，丢弃
+    for idx in np.flatnonzero(~long_enough):
+        logging.warning(f"Segment {idx+1} discarded due to insufficient length ({segment_lengths[idx]} records).")
+    
+    # 并行保存每个时间段，丢弃前99个数据点，因为这些点无法计算 MA99（直接切片，不复制数据）
+    long_indices = np.flatnonzero(long_enough).tolist()
+    results = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_process_segment)(idx, df.iloc[starts[idx] + 99:ends[idx]], open_ms[starts[idx] + 99:ends[idx]],
+                                  output_dir_separate, as_json)
+        for idx in long_indices
+    )
     
     # 列表用于存储合并输出的数据段
     combined_processed_segments = []
+    for idx, (segment_filename, records, combined_segment) in zip(long_indices, results):
+        logging.info(f"Segment {idx+1} processed and saved to '{segment_filename}'. Records: {records}")
+        combined_processed_segments.append(combined_segment)
     
-    # 处理每个时间段
-    for idx, segment in enumerate(segments):
-        if len(segment) >= 99:
-            seg = segment.copy()
-            seg.reset_index(drop=True, inplace=True)
-            
-            # 检查并填补缺失值
-            if seg.isnull().values.any():
-                logging.warning(f"Segment {idx+1} contains missing values. Filling forward.")
-                seg.fillna(method='ffill', inplace=True)
-                seg.fillna(method='bfill', inplace=True)
-            
-            # 计算技术指标
-            
-            ## 1. 移动平均线 (MA7, MA25, MA99)
-            seg['MA7'] = seg['close_price'].rolling(window=7).mean()
-            seg['MA25'] = seg['close_price'].rolling(window=25).mean()
-            seg['MA99'] = seg['close_price'].rolling(window=99).mean()
-            
-            ## 2. 肯特纳通道 (Keltner Channels)
-            # 计算 ATR50
-            atr50 = volatility.AverageTrueRange(high=seg['high_price'], low=seg['low_price'], close=seg['close_price'], window=50)
-            seg['ATR50'] = atr50.average_true_range()
-            # 计算 MA50
-            seg['MA50'] = seg['close_price'].rolling(window=50).mean()
-            # 计算肯特纳通道的上轨和下轨
-            multiplier = 2.75
-            seg['Keltner_Upper'] = seg['MA50'] + multiplier * seg['ATR50']
-            seg['Keltner_Lower'] = seg['MA50'] - multiplier * seg['ATR50']
-            
-            ## 3. 相对强弱指数 (RSI)
-            rsi = momentum.RSIIndicator(close=seg['close_price'], window=14)
-            seg['RSI'] = rsi.rsi()
-            
-            ## 4. 移动平均收敛散度 (MACD)
-            macd = trend.MACD(close=seg['close_price'])
-            seg['MACD'] = macd.macd()
-            seg['MACD_Signal'] = macd.macd_signal()
-            seg['MACD_Hist'] = macd.macd_diff()
-            
-            ## 5. 布林带 (Bollinger Bands)
-            bollinger = volatility.BollingerBands(close=seg['close_price'], window=20, window_dev=2)
-            seg['Bollinger_High'] = bollinger.bollinger_hband()
-            seg['Bollinger_Low'] = bollinger.bollinger_lband()
-            seg['Bollinger_Middle'] = bollinger.bollinger_mavg()
-            
-            ## 6. 随机指标 (Stochastic Oscillator)
-            stochastic = momentum.StochasticOscillator(high=seg['high_price'], low=seg['low_price'], close=seg['close_price'], window=14, smooth_window=3)
-            seg['Stochastic_%K'] = stochastic.stoch()  # 修正方法调用
-            seg['Stochastic_%D'] = stochastic.stoch_signal()  # 修正方法调用
-            
-            ## 7. 平均方向性指数 (ADX)
-            adx = trend.ADXIndicator(high=seg['high_price'], low=seg['low_price'], close=seg['close_price'], window=14)
-            seg['ADX'] = adx.adx()
-            seg['ADX_PDI'] = adx.adx_pos()
-            seg['ADX_MDI'] = adx.adx_neg()
-            
-            ## 8. 威廉指标 (Williams %R)
-            williams = momentum.WilliamsRIndicator(high=seg['high_price'], low=seg['low_price'], close=seg['close_price'], lbp=14)  # 修正参数名
-            seg['Williams_%R'] = williams.williams_r()
-            
-            ## 9. 资金流量指标 (Chaikin Money Flow, CMF)
-            cmf = volume.ChaikinMoneyFlowIndicator(high=seg['high_price'], low=seg['low_price'], close=seg['close_price'], volume=seg['volume'], window=20)
-            seg['CMF'] = cmf.chaikin_money_flow()
-            
-            ## 10. 资金流向指标 (Money Flow Index, MFI)
-            mfi = volume.MFIIndicator(high=seg['high_price'], low=seg['low_price'], close=seg['close_price'], volume=seg['volume'], window=14)
-            seg['MFI'] = mfi.money_flow_index()
-            
-            ## 11. 指数移动平均线 (EMA12, EMA26)
-            ema12 = trend.EMAIndicator(close=seg['close_price'], window=12)
-            seg['EMA12'] = ema12.ema_indicator()
-            ema26 = trend.EMAIndicator(close=seg['close_price'], window=26)
-            seg['EMA26'] = ema26.ema_indicator()
-            
-            # 丢弃前99个数据点，因为这些点无法计算 MA99
-            seg = seg.iloc[99:].reset_index(drop=True)
-            
-            # 将 datetime 列转换为字符串，以确保 JSON 序列化
-            seg['open_time'] = seg['open_time'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            seg['close_time'] = seg['close_time'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 将处理后的段转换为字典列表
-            processed_data = seg.to_dict(orient='records')
-            
-            # 保存为单独的 JSON 文件
-            segment_filename = os.path.join(output_dir_separate, f'segment_{idx+1}.json')
-            with open(segment_filename, 'w', encoding='utf-8') as f_out:
-                json.dump(processed_data, f_out, ensure_ascii=False, indent=4)
-            logging.info(f"Segment {idx+1} processed and saved to '{segment_filename}'. Records: {len(processed_data)}")
-            
-            # 为合并输出，包含每个段的信息
-            combined_processed_segments.append({
-                "segment_id": idx+1,
-                "start_time": seg['open_time'].iloc[0],
-                "end_time": seg['close_time'].iloc[-1],
-                "records": processed_data
-            })
-        else:
-            # 段长度不足，丢弃
-            logging.warning(f"Segment {idx+1} discarded due to insufficient length ({len(segment)} records).")
-    
-    # 保存合并后的 JSON 文件
-    with open(output_file_combined, 'w', encoding='utf-8') as f_combined:
-        json.dump(combined_processed_segments, f_combined, ensure_ascii=False, indent=4)
+    # 保存合并后的文件
+    if as_json:
+        with open(output_file_combined, 'wb') as f_combined:
+            f_combined.write(orjson.dumps(combined_processed_segments, option=orjson.OPT_INDENT_2))
+    elif combined_processed_segments:
+        combined_df = pd.concat(combined_processed_segments, ignore_index=True)
+        combined_df.to_parquet(output_file_combined, compression='snappy', index=False)
+    else:
+        logging.warning(f"No segment is long enough, '{output_file_combined}' is not written.")
     
     logging.info(f"Processing complete. Separate segments saved to '{output_dir_separate}' and combined output saved to '{output_file_combined}'.")
 
+def _process_one(file, as_json=False, segment_jobs=1):
+    """
+    处理单个交易对文件，每个交易对的段文件写入各自的子目录，避免互相覆盖。
+
+    :param file: 输入的K线 JSON 文件路径
+    :param as_json: 是否以 JSON 格式输出
+    :param segment_jobs: 单个文件内并行保存段文件的进程数（在进程池 worker 中调用时必须为 1，不能嵌套进程池）
+    """
+    filename = os.path.basename(file)
+    prefix = filename.split("_")[0]
+    output_dir = os.path.join("tmp_segments", prefix)
+    output_combined = f'{prefix}_output.json' if as_json else f'{prefix}_output.parquet'
+    process_crypto_data(file, output_dir, output_combined, as_json=as_json, n_jobs=segment_jobs)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='将K线数据分割为连续时间段并计算技术指标')
+    parser.add_argument('--json', action='store_true', help='以 JSON 格式输出（默认输出 Parquet）')
+    parser.add_argument('--segment-jobs', type=int, default=1,
+                        help='单个文件内并行保存段文件的进程数（默认 1，此时各文件之间并行；大于 1 时改为逐个处理文件）')
+    args = parser.parse_args()
+    
     all_file = [
         '../tmp/BNBUSDT_historical_10y_klines.json',
         '../tmp/BTCUSDT_historical_10y_klines.json',
@@ -169,9 +163,15 @@ if __name__ == "__main__":
         '../tmp/XRPUSDT_historical_10y_klines.json'
     ]
 
-    for file in all_file:
-        filename = os.path.basename(file)
-        prefix = filename.split("_")[0]
-        output_dir = "tmp_segments"
-        output_combined = f'{prefix}_output.json'
-        process_crypto_data(file, output_dir, output_combined)
\ No newline at end of file
+    # 在主进程中先编译一次指标内核并写入磁盘缓存，子进程直接加载缓存，避免每个进程各自重复编译
+    warmup()
+    
+    if args.segment_jobs > 1:
+        # 在文件内按段并行时逐个处理文件：不能在进程池的 worker 中再启动 joblib 的 loky 进程池，
+        # 嵌套的进程池会让 worker 在写完输出后无法退出
+        for file in all_file:
+            _process_one(file, args.json, args.segment_jobs)
+    else:
+        # 各文件相互独立，使用多进程并行处理
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(_process_one, all_file, [args.json] * len(all_file)))
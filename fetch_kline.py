@@ -1,12 +1,19 @@
-import json
-import math
+import asyncio
 import time
 from datetime import datetime, timedelta, timezone
+import aiohttp
+import numpy as np
+import orjson
+import pandas as pd
 from binance.client import Client
 from tqdm import tqdm
 
-# 初始化 Binance 客户端（无需 API 密钥即可获取公开数据）
-client = Client()
+# 币安 K 线接口（公开数据，无需 API 密钥）
+KLINES_URL = 'https://api.binance.com/api/v3/klines'
+# 每分钟允许的请求权重（币安现货限额为 6000，这里留出余量）
+REQUEST_WEIGHT_PER_MINUTE = 4800
+# limit=1000 时单次 K 线请求的权重
+KLINES_REQUEST_WEIGHT = 2
 
 def get_interval_timedelta(interval):
     """
@@ -33,6 +40,102 @@ def get_interval_timedelta(interval):
     else:
         raise ValueError("Unsupported interval format")
 
+class WeightLimiter:
+    """
+    基于令牌桶的请求权重限流器，并根据响应头 X-MBX-USED-WEIGHT-1M 校正剩余额度。
+    """
+
+    def __init__(self, weight_per_minute):
+        """
+        :param weight_per_minute: 每分钟允许使用的请求权重
+        """
+        self.capacity = weight_per_minute
+        self.tokens = weight_per_minute
+        self.refill_per_second = weight_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, weight):
+        """
+        等待直到有足够的权重额度，然后扣除。
+
+        :param weight: 本次请求的权重
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+                self.updated_at = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.refill_per_second)
+
+    def update_used_weight(self, used_weight):
+        """
+        用服务端返回的本分钟已用权重收紧剩余额度。
+
+        :param used_weight: X-MBX-USED-WEIGHT-1M 响应头的值
+        """
+        self.tokens = min(self.tokens, self.capacity - used_weight)
+
+async def fetch_klines_window(session, limiter, semaphore, symbol, interval, start_ms, end_ms, limit):
+    """
+    获取单个时间窗口内的 K 线数据，遇到限流（429/418）时按 Retry-After 等待后重试。
+
+    :param session: aiohttp 会话
+    :param limiter: 请求权重限流器
+    :param semaphore: 限制并发请求数的信号量
+    :param symbol: 交易对，例如 'BTCUSDT'
+    :param interval: K 线时间间隔，例如 Client.KLINE_INTERVAL_1HOUR
+    :param start_ms: 窗口开始时间（毫秒）
+    :param end_ms: 窗口结束时间（毫秒）
+    :param limit: 每次请求的最大数据条数
+    :return: 该窗口内的原始 K 线数据列表
+    """
+    params = {
+        'symbol': symbol,
+        'interval': interval,
+        'startTime': start_ms,
+        'endTime': end_ms,
+        'limit': limit
+    }
+    async with semaphore:
+        while True:
+            await limiter.acquire(KLINES_REQUEST_WEIGHT)
+            async with session.get(KLINES_URL, params=params) as response:
+                used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+                if used_weight is not None:
+                    limiter.update_used_weight(int(used_weight))
+                if response.status in (418, 429):
+                    await asyncio.sleep(int(response.headers.get('Retry-After', 60)))
+                    continue
+                response.raise_for_status()
+                return await response.json()
+
+async def fetch_all_klines(symbol, interval, windows, limit, max_concurrency=10):
+    """
+    并发获取所有时间窗口的 K 线数据。
+
+    :param symbol: 交易对，例如 'BTCUSDT'
+    :param interval: K 线时间间隔
+    :param windows: (开始毫秒, 结束毫秒) 时间窗口列表
+    :param limit: 每次请求的最大数据条数
+    :param max_concurrency: 最大并发请求数
+    :return: 与 windows 顺序一致的 K 线数据列表的列表
+    """
+    limiter = WeightLimiter(REQUEST_WEIGHT_PER_MINUTE)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    with tqdm(total=len(windows), desc="Fetching Klines") as pbar:
+        async def fetch(start_ms, end_ms):
+            klines = await fetch_klines_window(session, limiter, semaphore, symbol, interval, start_ms, end_ms, limit)
+            pbar.update(1)
+            return klines
+
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(*[fetch(start_ms, end_ms) for start_ms, end_ms in windows])
+
 def get_all_historical_klines(symbol, interval, start_time, end_time):
     """
     获取指定交易对在指定时间范围内的所有 K 线数据。
@@ -43,78 +146,50 @@ def get_all_historical_klines(symbol, interval, start_time, end_time):
     :param end_time: 结束时间（datetime 对象，时区感知）
     :return: 按时间排序的 K 线数据列表
     """
-    klines = []
     limit = 1000  # 每次请求的最大数据条数
-    start_str = start_time.strftime("%d %b %Y %H:%M:%S")
-    end_str = end_time.strftime("%d %b %Y %H:%M:%S")
     
-    # 计算每个请求能覆盖的时间范围
-    delta_per_request = get_interval_timedelta(interval) * limit
+    # 预先按每个请求能覆盖的时间范围切分出所有时间窗口，窗口之间互不重叠
+    span_ms = int(get_interval_timedelta(interval).total_seconds() * 1000) * limit
+    start_ms = int(start_time.timestamp() * 1000)
+    end_ms = int(end_time.timestamp() * 1000)
+    windows = [(window_start, min(window_start + span_ms - 1, end_ms))
+               for window_start in range(start_ms, end_ms, span_ms)]
     
-    # 估算总请求次数（用于进度条）
-    total_delta = end_time - start_time
-    total_requests = math.ceil(total_delta / delta_per_request)
-    
-    with tqdm(total=total_requests, desc="Fetching Klines") as pbar:
-        while True:
-            temp_klines = client.get_historical_klines(
-                symbol=symbol,
-                interval=interval,
-                start_str=start_str,
-                end_str=end_str,
-                limit=limit
-            )
-            
-            if not temp_klines:
-                break
-            
-            klines.extend(temp_klines)
-            
-            # 获取最后一条 K 线的收盘时间
-            last_close_time = temp_klines[-1][6]  # 收盘时间（毫秒）
-            
-            # 设置下一个请求的 start_time 为最后一条 K 线的收盘时间 +1 毫秒
-            start_time_new = last_close_time + 1
-            if start_time_new >= end_time.timestamp() * 1000:
-                break
-            start_str = datetime.fromtimestamp(start_time_new / 1000, tz=timezone.utc).strftime("%d %b %Y %H:%M:%S")
-            
-            pbar.update(1)
-            
-            # 为了避免请求过于频繁，建议添加短暂的延时
-            time.sleep(0.2)
-            
-            # 如果返回的数据少于 limit，说明已获取完毕
-            if len(temp_klines) < limit:
-                break
-                
-    return klines
+    results = asyncio.run(fetch_all_klines(symbol, interval, windows, limit))
+    return [k for window_klines in results for k in window_klines]
+
+def format_ms_timestamps(timestamps_ms):
+    """
+    将毫秒时间戳批量格式化为 UTC 时间字符串。
+
+    :param timestamps_ms: 毫秒时间戳数组
+    :return: 'YYYY-MM-DD HH:MM:SS' 格式的字符串数组
+    """
+    times = pd.to_datetime(np.asarray(timestamps_ms, dtype=np.int64), unit='ms', utc=True)
+    return times.strftime('%Y-%m-%d %H:%M:%S').to_numpy()
 
 def transform_klines(klines):
     """
-    将原始 K 线数据转换为包含明确字段的字典列表。
+    将原始 K 线数据按列批量转换为包含明确字段的 DataFrame。
 
     :param klines: 原始 K 线数据列表
-    :return: 转换后的 K 线数据列表
+    :return: 转换后的 K 线数据 DataFrame
     """
-    transformed = []
-    for k in klines:
-        k_dict = {
-            "open_time": datetime.fromtimestamp(k[0]/1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
-            "open_price": float(k[1]),
-            "high_price": float(k[2]),
-            "low_price": float(k[3]),
-            "close_price": float(k[4]),
-            "volume": float(k[5]),
-            "close_time": datetime.fromtimestamp(k[6]/1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
-            "quote_asset_volume": float(k[7]),
-            "number_of_trades": int(k[8]),
-            "taker_buy_base_asset_volume": float(k[9]),
-            "taker_buy_quote_asset_volume": float(k[10]),
-            # "ignore": k[11]  # 忽略的参数
-        }
-        transformed.append(k_dict)
-    return transformed
+    # 原始数据每条 12 个字段，最后一个 "ignore" 字段不使用
+    raw = np.asarray(klines, dtype=object).reshape(-1, 12)
+    return pd.DataFrame({
+        "open_time": format_ms_timestamps(raw[:, 0]),
+        "open_price": raw[:, 1].astype(np.float64),
+        "high_price": raw[:, 2].astype(np.float64),
+        "low_price": raw[:, 3].astype(np.float64),
+        "close_price": raw[:, 4].astype(np.float64),
+        "volume": raw[:, 5].astype(np.float64),
+        "close_time": format_ms_timestamps(raw[:, 6]),
+        "quote_asset_volume": raw[:, 7].astype(np.float64),
+        "number_of_trades": raw[:, 8].astype(np.int64),
+        "taker_buy_base_asset_volume": raw[:, 9].astype(np.float64),
+        "taker_buy_quote_asset_volume": raw[:, 10].astype(np.float64),
+    })
 
 def main():
     fetch_years = 10
@@ -131,12 +206,12 @@ def main():
     transformed_klines = transform_klines(klines)
     
     # 按时间排序（从早到晚）
-    transformed_klines.sort(key=lambda x: x['open_time'])
+    transformed_klines = transformed_klines.sort_values('open_time', kind='stable')
     
     # 保存为 JSON 文件
     output_file = f'tmp/{symbol}_historical_{fetch_years}y_klines.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(transformed_klines, f, ensure_ascii=False, indent=4)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(transformed_klines.to_dict(orient='records'), option=orjson.OPT_INDENT_2))
     
     print(f"数据已保存到 {output_file}。")
 
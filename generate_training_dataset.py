@@ -1,58 +1,59 @@
-import json
-import pandas as pd
+import orjson
+import numpy as np
 import os
+from kline_utils import records_to_frame, rolling_mean
 
 def calculate_indicators(input_file):
     try:
         # 读取JSON文件
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(input_file, 'rb') as f:
+            data = orjson.loads(f.read())
         print(f"成功读取输入文件: {input_file}")
     except FileNotFoundError:
         print(f"错误: 找不到文件 {input_file}")
         return
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"错误: 解析JSON文件时出错: {e}")
         return
 
-    # 将数据转换为DataFrame
-    df = pd.DataFrame(data)
+    # 将数据按列转换为DataFrame
+    df = records_to_frame(data)
+    del data
     total_points = len(df)
     print(f"总数据点数: {total_points}")
 
-    # 将时间字段转换为datetime对象
+    # 将开盘时间解析为 int64 毫秒时间戳用于排序，时间字符串列本身保持不变，输出时直接复用
     try:
-        df['open_time'] = pd.to_datetime(df['open_time'])
-        df['close_time'] = pd.to_datetime(df['close_time'])
-        print("成功将时间字段转换为 datetime 对象")
+        open_ms = np.array(df['open_time'].to_numpy(), dtype='datetime64[ms]').view(np.int64)
+        print("成功解析开盘时间")
     except Exception as e:
         print(f"错误: 转换时间字段时出错: {e}")
         return
 
     # 确保数据按时间排序
-    df = df.sort_values('open_time').reset_index(drop=True)
+    df = df.iloc[np.argsort(open_ms, kind='stable')].reset_index(drop=True)
     print(f"排序后的数据点数: {len(df)}")
 
     # 计算移动平均线
-    df['MA7'] = df['close_price'].rolling(window=7).mean()
-    df['MA25'] = df['close_price'].rolling(window=25).mean()
-    df['MA99'] = df['close_price'].rolling(window=99).mean()
+    close = df['close_price'].to_numpy()
+    df['MA7'] = rolling_mean(close, 7)
+    df['MA25'] = rolling_mean(close, 25)
+    df['MA99'] = rolling_mean(close, 99)
     print("成功计算 MA7, MA25, MA99")
 
-    # 计算前一个收盘价
-    df['previous_close'] = df['close_price'].shift(1)
-
-    # 计算True Range (TR)
-    df['tr1'] = df['high_price'] - df['low_price']
-    df['tr2'] = (df['high_price'] - df['previous_close']).abs()
-    df['tr3'] = (df['low_price'] - df['previous_close']).abs()
-    df['TR'] = df[['tr1', 'tr2', 'tr3']].max(axis=1)
+    # 计算True Range (TR)，首行没有前收盘价，取最高价减最低价
+    high = df['high_price'].to_numpy()
+    low = df['low_price'].to_numpy()
+    previous_close = np.empty_like(close)
+    previous_close[0] = np.nan
+    previous_close[1:] = close[:-1]
+    df['TR'] = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
 
     # 计算ATR(50)
-    df['ATR50'] = df['TR'].rolling(window=50).mean()
+    df['ATR50'] = rolling_mean(df['TR'].to_numpy(), 50)
 
     # 计算MA(50)
-    df['MA50'] = df['close_price'].rolling(window=50).mean()
+    df['MA50'] = rolling_mean(close, 50)
 
     # 计算肯特那通道
     multiplier = 2.75
@@ -64,10 +65,14 @@ def calculate_indicators(input_file):
     points_after_calculation = len(df)
     print(f"计算所有指标后的数据点数: {points_after_calculation}")
 
-    # 舍弃无法计算所有指标的行
+    # 舍弃无法计算所有指标的行：窗口最长的 MA99 从下标 98 开始有效（ATR50/MA50 从下标 49 开始），
+    # 先按位置切掉预热区；输入中有缺失值时其后的窗口也无法计算，再用布尔掩码去掉这些行
     required_columns = ['MA7', 'MA25', 'MA99', 'KC_upper', 'KC_lower']
     before_drop = len(df)
-    df_final = df.dropna(subset=required_columns)
+    df_final = df.iloc[99 - 1:]
+    valid = df_final[required_columns].notna().to_numpy().all(axis=1)
+    if not valid.all():
+        df_final = df_final[valid]
     after_drop = len(df_final)
     discarded_points = before_drop - after_drop
     print(f"舍弃的数据点数: {discarded_points}")
@@ -87,11 +92,7 @@ def calculate_indicators(input_file):
         print(f"错误: 缺少必要的列: {missing_columns}")
         return
 
-    df_output = df_final[output_columns].copy()
-
-    # 将时间字段转换回字符串格式
-    df_output['open_time'] = df_output['open_time'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    df_output['close_time'] = df_output['close_time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    df_output = df_final[output_columns]
 
     # 将DataFrame转换为字典列表
     output_data = df_output.to_dict(orient='records')
@@ -110,8 +111,8 @@ def calculate_indicators(input_file):
 
     # 将结果写入新的JSON文件
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=4)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
         print(f"成功写入输出文件: {output_file}")
     except Exception as e:
         print(f"错误: 写入JSON文件时出错: {e}")
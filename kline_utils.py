@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# K 线 JSON 中数值字段的数据类型，构建 DataFrame 时直接指定，跳过 pandas 的类型推断
+KLINE_DTYPES = {
+    'open_price': np.float64,
+    'high_price': np.float64,
+    'low_price': np.float64,
+    'close_price': np.float64,
+    'volume': np.float64,
+    'quote_asset_volume': np.float64,
+    'number_of_trades': np.int64,
+    'taker_buy_base_asset_volume': np.float64,
+    'taker_buy_quote_asset_volume': np.float64,
+}
+
+def records_to_frame(records):
+    """
+    将 K 线字典列表按列转置后构建 DataFrame，数值列使用 KLINE_DTYPES 中的类型。
+
+    :param records: K 线字典列表
+    :return: pandas DataFrame
+    """
+    if not records:
+        return pd.DataFrame()
+    columns = {}
+    for key in records[0]:
+        values = [record.get(key) for record in records]
+        dtype = KLINE_DTYPES.get(key)
+        if dtype is np.int64 and None in values:
+            # 整数列含缺失值时与 pandas 推断结果一致，退化为浮点
+            dtype = np.float64
+        columns[key] = values if dtype is None else np.array(values, dtype=dtype)
+    return pd.DataFrame(columns, copy=False)
+
+def rolling_mean(values, window):
+    """
+    计算固定窗口的简单移动平均。数据全部为有限值时用前缀和一次算出所有窗口；
+    含 NaN 时逐窗口求均值（前缀和中的一个 NaN 会污染其后所有窗口），只有包含 NaN 的窗口为 NaN。
+
+    :param values: 数值数组
+    :param window: 窗口长度
+    :return: 滑动平均数组，前 window-1 个值为 NaN（与 rolling(window).mean() 一致）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) < window:
+        return result
+    if np.isfinite(values).all():
+        cumsum = np.concatenate(([0.0], np.cumsum(values)))
+        result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    else:
+        result[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return result
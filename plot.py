@@ -1,7 +1,8 @@
-import json
+import orjson
 import pandas as pd
 import mplfinance as mpf
 from datetime import datetime, timedelta, timezone
+from kline_utils import records_to_frame, rolling_mean
 
 def load_klines(file_path):
     """
@@ -11,27 +12,22 @@ def load_klines(file_path):
     :return: pandas DataFrame 包含K线数据
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            klines = json.load(f)
+        with open(file_path, 'rb') as f:
+            klines = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"文件 {file_path} 未找到。")
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"文件 {file_path} 不是有效的JSON格式。")
         return None
     
-    # 将K线数据转换为DataFrame
-    df = pd.DataFrame(klines)
+    # 将K线数据按列转换为DataFrame（数值列已是浮点/整数类型）
+    df = records_to_frame(klines)
     
     # 转换时间为datetime对象并设置为索引
     df['open_time'] = pd.to_datetime(df['open_time'], format='%Y-%m-%d %H:%M:%S')
     df.set_index('open_time', inplace=True)
     
-    # 转换价格和其他数值为浮点数
-    for col in ['open_price', 'high_price', 'low_price', 'close_price', 'volume',
-                'quote_asset_volume', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume']:
-        df[col] = df[col].astype(float)
-    
     return df
 
 def calculate_moving_averages(df, windows=[7, 25, 99]):
@@ -42,8 +38,9 @@ def calculate_moving_averages(df, windows=[7, 25, 99]):
     :param windows: 移动平均窗口列表
     :return: DataFrame 包含移动平均线
     """
+    close = df['close_price'].to_numpy()
     for window in windows:
-        df[f'MA_{window}'] = df['close_price'].rolling(window=window).mean()
+        df[f'MA_{window}'] = rolling_mean(close, window)
     return df
 
 def filter_recent_days(df, days=4):
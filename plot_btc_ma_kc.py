@@ -1,7 +1,9 @@
-import json
+import orjson
+import numpy as np
 import pandas as pd
 import mplfinance as mpf
 from datetime import datetime, timedelta, timezone
+from kline_utils import records_to_frame, rolling_mean
 
 def load_klines(file_path):
     """
@@ -11,17 +13,17 @@ def load_klines(file_path):
     :return: pandas DataFrame 包含K线数据
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            klines = json.load(f)
+        with open(file_path, 'rb') as f:
+            klines = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"文件 {file_path} 未找到。")
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"文件 {file_path} 不是有效的JSON格式。")
         return None
     
-    # 将K线数据转换为DataFrame
-    df = pd.DataFrame(klines)
+    # 将K线数据按列转换为DataFrame（数值列已是浮点类型）
+    df = records_to_frame(klines)
     
     # 转换时间为datetime对象并设置为索引
     df['open_time'] = pd.to_datetime(df['open_time'], format='%Y-%m-%d %H:%M:%S')
@@ -36,10 +38,6 @@ def load_klines(file_path):
         'volume': 'Volume'
     }, inplace=True)
     
-    # 确保数值列为浮点数
-    for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-        df[col] = df[col].astype(float)
-    
     return df
 
 def calculate_moving_averages(df, windows=[7, 25, 50, 99]):
@@ -51,25 +49,26 @@ def calculate_moving_averages(df, windows=[7, 25, 50, 99]):
     :return: DataFrame 包含移动平均线和Keltner Channels
     """
     # 计算简单移动平均线（SMA）
+    close = df['Close'].to_numpy()
     for window in windows:
-        df[f'MA_{window}'] = df['Close'].rolling(window=window).mean()
+        df[f'MA_{window}'] = rolling_mean(close, window)
     
-    # 计算True Range (TR)
-    df['Previous_Close'] = df['Close'].shift(1)
-    df['TR'] = df[['High', 'Low', 'Previous_Close']].apply(
-        lambda x: max(x['High'] - x['Low'], abs(x['High'] - x['Previous_Close']), abs(x['Low'] - x['Previous_Close'])),
-        axis=1
-    )
+    # 计算True Range (TR)，首行没有前收盘价，取最高价减最低价（只作为中间数组，不写入DataFrame）
+    high = df['High'].to_numpy()
+    low = df['Low'].to_numpy()
+    previous_close = np.empty_like(close)
+    previous_close[0] = np.nan
+    previous_close[1:] = close[:-1]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
     
     # 计算ATR（Average True Range）
-    df['ATR_50'] = df['TR'].rolling(window=50).mean()
+    atr = rolling_mean(tr, 50)
+    df['ATR_50'] = atr
     
     # 计算肯特那通道的上轨和下轨
-    df['Upper_Channel'] = df['MA_50'] + (df['ATR_50'] * 2.75)
-    df['Lower_Channel'] = df['MA_50'] - (df['ATR_50'] * 2.75)
-    
-    # 删除辅助列
-    df.drop(['Previous_Close', 'TR'], axis=1, inplace=True)
+    ma50 = df['MA_50'].to_numpy()
+    df['Upper_Channel'] = ma50 + atr * 2.75
+    df['Lower_Channel'] = ma50 - atr * 2.75
     
     return df
 
@@ -93,21 +92,19 @@ def plot_candlestick_with_ma_kc(df, title='BTCUSDT - Last 4 Days K-Line with MA
     :param df: pandas DataFrame 包含K线数据、移动平均线和Keltner Channels
     :param title: 图表标题
     """
-    # 准备移动平均线和Keltner Channels的列表
-    ma_list = [col for col in df.columns if col.startswith('MA_') and col != 'MA_50']
-    kc_upper = df['Upper_Channel']
-    kc_lower = df['Lower_Channel']
+    # 预先取出移动平均线和Keltner Channels的数值数组
+    overlays = {col: df[col].to_numpy() for col in ('MA_7', 'MA_25', 'MA_99', 'Upper_Channel', 'Lower_Channel')}
     
     # 重命名列以符合mplfinance的要求
     plot_df = df[['Open', 'High', 'Low', 'Close', 'Volume']].copy()
     
     # 定义移动平均线样式
     addplots = [
-        mpf.make_addplot(df['MA_7'], color='blue', width=1.0, label='MA 7'),
-        mpf.make_addplot(df['MA_25'], color='orange', width=1.0, label='MA 25'),
-        mpf.make_addplot(df['MA_99'], color='green', width=1.0, label='MA 99'),
-        mpf.make_addplot(kc_upper, color='purple', linestyle='--', width=1.0, label='Upper Keltner'),
-        mpf.make_addplot(kc_lower, color='purple', linestyle='--', width=1.0, label='Lower Keltner')
+        mpf.make_addplot(overlays['MA_7'], color='blue', width=1.0, label='MA 7'),
+        mpf.make_addplot(overlays['MA_25'], color='orange', width=1.0, label='MA 25'),
+        mpf.make_addplot(overlays['MA_99'], color='green', width=1.0, label='MA 99'),
+        mpf.make_addplot(overlays['Upper_Channel'], color='purple', linestyle='--', width=1.0, label='Upper Keltner'),
+        mpf.make_addplot(overlays['Lower_Channel'], color='purple', linestyle='--', width=1.0, label='Lower Keltner')
     ]
     
     # 定义图表样式
@@ -1,58 +1,164 @@
-import json
+import mmap
+import orjson
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
 import mplfinance as mpf
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+from kline_utils import records_to_frame
 from datetime import datetime, timedelta
 import os
 
-def load_train_data(file_path):
+# 读取行分隔 JSON 时时间列保持字符串（否则 pyarrow 会自动推断为时间戳），其余列自动推断类型
+NDJSON_PARSE_OPTIONS = pa_json.ParseOptions(explicit_schema=pa.schema([
+    ('open_time', pa.string()),
+    ('close_time', pa.string()),
+]))
+
+# Parquet 缓存格式版本，写入缓存文件的元数据；加载逻辑或列类型变化时递增，旧缓存会被自动重建
+CACHE_VERSION = b'2'
+
+# 绘图用到的列
+PLOT_COLUMNS = [
+    'open_time', 'open_price', 'high_price', 'low_price', 'close_price', 'volume',
+    'MA7', 'MA25', 'MA99', 'KC_upper', 'KC_lower'
+]
+
+# 图表样式和图例在导入时构建一次，重复绘图时直接复用
+_STYLE = mpf.make_mpf_style(marketcolors=mpf.make_marketcolors(
+    up='g',
+    down='r',
+    inherit=True
+))
+
+_LEGEND_ELEMENTS = [
+    Line2D([0], [0], color='blue', lw=1, label='MA7'),
+    Line2D([0], [0], color='orange', lw=1, label='MA25'),
+    Line2D([0], [0], color='green', lw=1, label='MA99'),
+    Line2D([0], [0], color='red', lw=1, linestyle='--', label='KC Upper'),
+    Line2D([0], [0], color='red', lw=1, linestyle='--', label='KC Lower')
+]
+
+def _read_cache_schema(cache_path, file_path):
+    """
+    检查 Parquet 缓存是否可用：缓存存在、不早于 JSON 文件，且元数据中的格式版本与 CACHE_VERSION 一致。
+
+    :param cache_path: Parquet 缓存文件路径
+    :param file_path: 对应的JSON文件路径
+    :return: 缓存可用时返回其 schema，否则返回 None（需要重新解析 JSON 并重建缓存）
     """
-    从JSON文件加载训练数据。
+    if not (os.path.exists(cache_path) and os.path.exists(file_path)) \
+            or os.path.getmtime(cache_path) < os.path.getmtime(file_path):
+        return None
+    try:
+        schema = pq.read_schema(cache_path)
+    except (OSError, pa.ArrowInvalid):
+        # 缓存文件损坏或写入不完整，重新生成
+        return None
+    if (schema.metadata or {}).get(b'cache_version') != CACHE_VERSION:
+        print(f"缓存文件格式版本不一致，重新生成: {cache_path}")
+        return None
+    return schema
 
-    :param file_path: JSON文件路径
+def load_train_data(file_path, columns=None):
+    """
+    从JSON文件加载训练数据，首次加载后在旁边写入 Parquet 缓存，JSON 未更新时直接读取缓存。
+
+    :param file_path: JSON文件路径（以 .jsonl 结尾时按行分隔 JSON 读取）
+    :param columns: 需要返回的列名列表（open_time 始终作为索引），为 None 时返回全部列
     :return: pandas DataFrame 包含训练数据
     """
+    # 已有比 JSON 更新且格式版本一致的 Parquet 缓存时直接读取，跳过 JSON 解析和类型转换
+    cache_path = file_path + '.parquet'
+    cached_schema = _read_cache_schema(cache_path, file_path)
+    if cached_schema is not None:
+        # 只读取需要的列，其余列在 Parquet 中直接跳过，不解码
+        if columns is not None:
+            cached_columns = set(cached_schema.names)
+            columns = [col for col in columns if col != 'open_time' and col in cached_columns]
+        df = pd.read_parquet(cache_path, columns=columns)
+        print(f"成功读取缓存文件: {cache_path}")
+        print(f"总数据点数: {len(df)}")
+        return df
+
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if file_path.endswith('.jsonl'):
+            # 行分隔 JSON（每行一条记录）通过内存映射交给 pyarrow 多线程解析，直接得到列式数据，不经过 Python 对象；
+            # 时间列指定为字符串，与 JSON 数组的读取结果一致，下面统一解析
+            table = pa_json.read_json(pa.memory_map(file_path, 'r'), parse_options=NDJSON_PARSE_OPTIONS)
+            df = table.to_pandas(split_blocks=True, self_destruct=True)
+            del table
+        else:
+            # 内存映射文件后直接交给 orjson 解析，不再先把整个文件读入一份 bytes 副本
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = orjson.loads(memoryview(mapped))
+            # 将字典列表按列转置后构建DataFrame，避免 pandas 逐条记录推断类型
+            df = records_to_frame(data)
+            del data
         print(f"成功读取输入文件: {file_path}")
     except FileNotFoundError:
         print(f"错误: 文件 {file_path} 未找到。")
         return None
-    except json.JSONDecodeError as e:
+    except (ValueError, pa.ArrowInvalid) as e:
+        # orjson.JSONDecodeError 也是 ValueError 的子类；空文件无法内存映射时同样抛出 ValueError
         print(f"错误: 解析JSON文件时出错: {e}")
         return None
 
-    # 将数据转换为DataFrame
-    df = pd.DataFrame(data)
     print(f"总数据点数: {len(df)}")
 
     # 将时间字段转换为datetime对象并设置为索引
     try:
-        df['open_time'] = pd.to_datetime(df['open_time'], format='%Y-%m-%d %H:%M:%S')
+        # K线时间为 UTC；cache=True 对重复的时间字符串只解析一次
+        df['open_time'] = pd.to_datetime(df['open_time'], format='%Y-%m-%d %H:%M:%S', cache=True, utc=True)
         df.set_index('open_time', inplace=True)
         print("成功将 'open_time' 转换为 datetime 对象并设置为索引")
     except Exception as e:
         print(f"错误: 转换时间字段时出错: {e}")
         return None
 
-    # 确保价格和其他数值列为浮点数
+    # 确保价格和其他数值列为数值类型
     numeric_columns = [
         'open_price', 'high_price', 'low_price', 'close_price', 'volume',
         'quote_asset_volume', 'number_of_trades',
         'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume',
         'MA7', 'MA25', 'MA99', 'KC_upper', 'KC_lower'
     ]
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        else:
-            print(f"警告: 列 '{col}' 不存在于数据中。")
+    existing_columns = [col for col in numeric_columns if col in df.columns]
+    missing_columns = [col for col in numeric_columns if col not in df.columns]
+    if missing_columns:
+        print(f"警告: 以下列不存在于数据中: {', '.join(missing_columns)}")
+    # 一次性转换所有数值列（已是数值类型的列保持不变）
+    df[existing_columns] = df[existing_columns].apply(pd.to_numeric, errors='coerce')
+
+    # 绘图只需要约 7 位有效数字，价格和指标用 float32、成交笔数用 int32（含缺失值时保持 float32），内存占用减半
+    dtypes = {col: np.float32 for col in existing_columns}
+    if 'number_of_trades' in dtypes and not df['number_of_trades'].isna().any():
+        dtypes['number_of_trades'] = np.int32
+    df = df.astype(dtypes)
+
+    # 写入 Parquet 缓存（保留 datetime 索引和数值类型），下次运行直接读取
+    try:
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'cache_version': CACHE_VERSION})
+        pq.write_table(table, cache_path, compression='zstd')
+        del table
+        print(f"已写入缓存文件: {cache_path}")
+    except OSError as e:
+        print(f"警告: 写入缓存文件时出错: {e}")
+
+    # 缓存保存完整数据，返回前再按需要的列筛选
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
 
     return df
 
 def filter_last_n_days(df, days=6):
     """
-    筛选最后N天的数据。
+    筛选最后N天的数据（要求索引按时间升序排列）。
 
     :param df: pandas DataFrame 包含训练数据
     :param days: 天数
@@ -60,7 +166,9 @@ def filter_last_n_days(df, days=6):
     """
     end_time = df.index.max()
     start_time = end_time - timedelta(days=days)
-    filtered_df = df.loc[start_time:end_time].copy()
+    # 训练数据已按时间排序，用二分查找定位起始位置后按位置切片，避免按标签索引的开销
+    start_pos = df.index.searchsorted(start_time, side='left')
+    filtered_df = df.iloc[start_pos:].copy()
     print(f"绘制数据的时间范围: {start_time} 至 {end_time}")
     print(f"筛选后的数据点数 (最后{days}天): {len(filtered_df)}")
     return filtered_df
@@ -86,63 +194,44 @@ def plot_candlestick_with_indicators(df, title='BTCUSDT - Last 6 Days K-Line wit
         'volume': 'Volume'
     }, inplace=True)
 
-    # 准备移动平均线和肯特那通道的 addplot 列表
-    addplots = []
-
-    # 添加MA7, MA25, MA99
-    ma_colors = {'MA7': 'blue', 'MA25': 'orange', 'MA99': 'green'}
-    for ma, color in ma_colors.items():
-        if ma in df.columns:
-            addplots.append(mpf.make_addplot(df[ma], color=color, width=1))
-
-    # 添加肯特那通道
-    if 'KC_upper' in df.columns and 'KC_lower' in df.columns:
-        addplots.append(mpf.make_addplot(df['KC_upper'], color='red', linestyle='--', width=1))
-        addplots.append(mpf.make_addplot(df['KC_lower'], color='red', linestyle='--', width=1))
-
-    # 定义图表样式
-    mc = mpf.make_marketcolors(
-        up='g',
-        down='r',
-        inherit=True
-    )
-    s = mpf.make_mpf_style(marketcolors=mc)
+    # 预先取出移动平均线和肯特那通道的数值数组，每列只从DataFrame中取一次
+    overlays = {col: df[col].to_numpy() for col in ('MA7', 'MA25', 'MA99', 'KC_upper', 'KC_lower') if col in df.columns}
 
     # 定义移动平均线参数（如果使用mav）
-    mav = tuple([7, 25, 99])  # 即使已添加 addplot，这里保留以确保兼容性
+    mav = tuple([7, 25, 99])  # 即使已单独绘制均线，这里保留以确保兼容性
 
-    # 绘制图表
-    mpf.plot(
+    # 绘制K线图，返回图形对象以便叠加指标线
+    fig, axes = mpf.plot(
         plot_df,
         type='candle',
-        style=s,
+        style=_STYLE,
         title=title,
         volume=True,
-        addplot=addplots,
         mav=mav,
         show_nontrading=False,
         datetime_format='%Y-%m-%d %H:%M',
         xrotation=15,
-        tight_layout=True
+        tight_layout=True,
+        returnfig=True
     )
 
-    # 添加图例
-    # mplfinance 不直接支持为 addplot 添加标签，需手动创建图例
-    import matplotlib.pyplot as plt
-
-    # 获取当前图形
-    ax = plt.gca()
-
-    # 创建图例
-    from matplotlib.lines import Line2D
-    legend_elements = [
-        Line2D([0], [0], color='blue', lw=1, label='MA7'),
-        Line2D([0], [0], color='orange', lw=1, label='MA25'),
-        Line2D([0], [0], color='green', lw=1, label='MA99'),
-        Line2D([0], [0], color='red', lw=1, linestyle='--', label='KC Upper'),
-        Line2D([0], [0], color='red', lw=1, linestyle='--', label='KC Lower')
-    ]
-    ax.legend(handles=legend_elements, loc='upper left')
+    # 在K线所在的主坐标轴上叠加指标线（show_nontrading=False 时横坐标为K线序号）
+    ax = axes[0]
+    x = np.arange(len(plot_df))
+
+    # 均线和肯特那通道各合并为一个 LineCollection，多条线一次绘制，而不是每条线单独走一遍 addplot
+    ma_colors = {'MA7': 'blue', 'MA25': 'orange', 'MA99': 'green'}
+    ma_columns = [ma for ma in ma_colors if ma in overlays]
+    if ma_columns:
+        ax.add_collection(LineCollection([np.column_stack((x, overlays[ma])) for ma in ma_columns],
+                                         colors=[ma_colors[ma] for ma in ma_columns], linewidths=1))
+    if 'KC_upper' in overlays and 'KC_lower' in overlays:
+        ax.add_collection(LineCollection([np.column_stack((x, overlays['KC_upper'])),
+                                          np.column_stack((x, overlays['KC_lower']))],
+                                         colors='red', linestyles='--', linewidths=1))
+
+    # 添加图例（指标线不经过 mplfinance 绘制，需手动创建图例）
+    ax.legend(handles=_LEGEND_ELEMENTS, loc='upper left')
 
     # 显示图表
     plt.show()
@@ -151,8 +240,8 @@ def main():
     # 定义输入文件路径
     input_file = os.path.join('dataset', 'BTCUSDT_historical_klines_train.json')
 
-    # 加载数据
-    df = load_train_data(input_file)
+    # 加载数据（绘图只需要K线价格、成交量和指标列）
+    df = load_train_data(input_file, columns=PLOT_COLUMNS)
 
     if df is None:
         return
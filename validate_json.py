@@ -1,96 +1,248 @@
-import json
-from datetime import datetime, timedelta, timezone
+import argparse
+import os
+import ijson
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from numba_compat import njit
 
 def load_klines(file_path):
     """
-    从JSON文件加载K线数据。
+    从JSON文件流式读取K线数据，逐条产出，不把整个文件载入内存。
 
-    :param file_path: JSON文件路径
-    :return: K线数据列表
+    :param file_path: JSON文件路径（以 .jsonl 结尾时按行分隔 JSON 读取）
+    :return: 逐条产出K线数据的生成器；文件不存在或 JSON 无效（包括读到一半才发现文件被截断）时，
+             FileNotFoundError / ijson.JSONError 会在迭代过程中抛出，由调用方按验证失败处理
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            klines = json.load(f)
-        return klines
-    except FileNotFoundError:
-        print(f"文件 {file_path} 未找到。")
-        return []
-    except json.JSONDecodeError:
-        print(f"文件 {file_path} 不是有效的JSON格式。")
-        return []
+    with open(file_path, 'rb') as f:
+        # ijson 会自动选用可用的最快后端（安装了 yajl2_c 时使用 C 实现）
+        if file_path.endswith('.jsonl'):
+            # 行分隔 JSON：每行是一个独立的顶层对象
+            yield from ijson.items(f, '', multiple_values=True, use_float=True)
+        else:
+            yield from ijson.items(f, 'item', use_float=True)
 
 def sort_klines(klines):
     """
     按照open_time升序排序K线数据。
 
     :param klines: 原始K线数据列表
-    :return: 排序后的K线数据列表
+    :return: 排序后的K线数据列表（已有序时直接返回原列表）
+    """
+    if not klines:
+        return klines
+    # 一次性解析为 datetime64 后在 numpy 中排序，避免 sorted() 对每次比较调用 Python 的 key 函数
+    times = np.array([k['open_time'] for k in klines], dtype='datetime64[s]')
+    if np.all(times[:-1] <= times[1:]):
+        return klines
+    order = np.argsort(times, kind='stable')
+    return [klines[i] for i in order]
+
+# 报告中每类问题最多列出的时间点数量
+SAMPLE_LIMIT = 10
+
+def format_times(times):
+    """
+    将 datetime64 数组格式化为 'YYYY-MM-DD HH:MM:SS' 字符串列表。
+
+    :param times: datetime64[s] 数组
+    :return: 时间字符串列表
     """
-    return sorted(klines, key=lambda x: x['open_time'])
+    return np.char.replace(np.datetime_as_string(times, unit='s'), 'T', ' ').tolist()
 
-def validate_klines(klines):
+@njit(cache=True, nogil=True)
+def _scan(ts):
+    """
+    扫描相邻两条记录的时间差（秒）：0 为重复，负数为倒序，大于 3600 为缺失。
+
+    :param ts: int64 秒级时间戳数组
+    :return: (时间差数组, 重复位置, 倒序位置, 缺口位置)，位置 i 表示第 i 条与第 i+1 条之间
+    """
+    n = max(len(ts) - 1, 0)
+    deltas = np.empty(n, dtype=np.int64)
+    dup_idx = np.empty(n, dtype=np.int64)
+    back_idx = np.empty(n, dtype=np.int64)
+    gap_idx = np.empty(n, dtype=np.int64)
+    n_dup = 0
+    n_back = 0
+    n_gap = 0
+    for i in range(n):
+        delta = ts[i + 1] - ts[i]
+        deltas[i] = delta
+        if delta == 0:
+            dup_idx[n_dup] = i
+            n_dup += 1
+        elif delta < 0:
+            back_idx[n_back] = i
+            n_back += 1
+        elif delta > 3600:
+            gap_idx[n_gap] = i
+            n_gap += 1
+    return deltas, dup_idx[:n_dup], back_idx[:n_back], gap_idx[:n_gap]
+
+def read_watermark(watermark_path):
+    """
+    读取上次验证通过时记录的最后一条open_time。
+
+    :param watermark_path: 水位线文件路径
+    :return: datetime64[s] 时间，文件不存在或内容无效时为 None
+    """
+    try:
+        with open(watermark_path, 'r', encoding='utf-8') as f:
+            return np.datetime64(f.read().strip(), 's')
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_watermark(watermark_path, last_time):
+    """
+    记录验证通过的最后一条open_time，下次增量验证从这里开始。
+
+    :param watermark_path: 水位线文件路径
+    :param last_time: datetime64[s] 时间
+    """
+    with open(watermark_path, 'w', encoding='utf-8') as f:
+        f.write(format_times(np.array([last_time]))[0])
+
+def validate_klines(klines, watermark_path=None):
     """
     验证K线数据的时间序列是否严格每小时递增，且无重复或缺失。
 
-    :param klines: 排序后的K线数据列表
+    :param klines: 按时间排序的K线数据（列表或逐条产出的可迭代对象）
+    :param watermark_path: 水位线文件路径；指定时只验证上次验证通过的最后一条及之后的数据，验证通过后更新水位线
     :return: 验证结果及详细信息
     """
-    if not klines:
+    # 读取时只保留open_time字符串，之后一次性解析为 datetime64 数组；
+    # 进度条每 10000 条且至少间隔 1 秒才检查刷新，避免每条记录都做一次进度更新
+    open_times = [k['open_time'] for k in tqdm(klines, desc="Loading Klines", mininterval=1.0, miniters=10000)]
+    if not open_times:
         return False, "K线数据为空。"
 
-    errors = []
-    duplicates = []
-    missing = []
-
-    # 将字符串时间转换为datetime对象列表
     try:
-        times = [datetime.strptime(k['open_time'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc) for k in klines]
+        times = np.array(open_times, dtype='datetime64[s]')
     except ValueError as e:
         return False, f"时间格式错误: {e}"
-
-    # 遍历时间列表，检查递增和缺失
-    for i in tqdm(range(1, len(times)), desc="Validating Klines"):
-        expected_time = times[i-1] + timedelta(hours=1)
-        actual_time = times[i]
-        if actual_time == times[i-1]:
-            duplicates.append(actual_time)
-        elif actual_time != expected_time:
-            # 计算缺失的时间点数量
-            delta = actual_time - expected_time
-            missing_hours = delta // timedelta(hours=1)
-            for j in range(1, missing_hours + 1):
-                missing_time = expected_time + timedelta(hours=j-1)
-                missing.append(missing_time.strftime('%Y-%m-%d %H:%M:%S'))
-
-    if duplicates or missing:
-        if duplicates:
-            errors.append(f"发现重复的时间点: {', '.join([dt.strftime('%Y-%m-%d %H:%M:%S') for dt in duplicates])}")
-        if missing:
-            errors.append(f"发现缺失的时间点，共 {len(missing)} 个: {', '.join(missing[:10])} {'...' if len(missing) > 20 else ''}")
+    del open_times
+    # 空字符串、None 和 'NaT' 会被解析为 NaT 而不报错，需单独检查，否则后续按整数比较时会溢出
+    invalid = np.isnat(times)
+    if invalid.any():
+        return False, f"时间格式错误: 第 {np.flatnonzero(invalid)[0]} 条 open_time 无效"
+
+    # 增量验证：从水位线对应的那一条开始（保留这一条与新数据衔接处的检查），之前的数据上次已验证通过；
+    # 文件中找不到水位线时（例如数据被重新生成）退回全量验证
+    if watermark_path is not None:
+        watermark = read_watermark(watermark_path)
+        if watermark is not None:
+            start = np.searchsorted(times, watermark, side='left')
+            if start < len(times) and times[start] == watermark:
+                print(f"增量验证：跳过水位线 {format_times(np.array([watermark]))[0]} 之前的 {start} 条数据")
+                times = times[start:]
+
+    # 在编译后的循环中一次扫描出重复、倒序和缺口的位置
+    deltas, dup_idx, back_idx, gap_idx = _scan(times.view(np.int64))
+
+    # 重复和倒序只取前 SAMPLE_LIMIT 条用于展示，总数直接由位置数组的长度得到
+    duplicates = times[dup_idx[:SAMPLE_LIMIT] + 1]
+    out_of_order = times[back_idx[:SAMPLE_LIMIT] + 1]
+
+    # 每个缺口内缺失的时间点为上一条之后每隔一小时的时间，直到下一条之前；
+    # 只统计总数，并最多展开前 SAMPLE_LIMIT 个时间点，写入预先分配好的数组
+    gap_hours = deltas[gap_idx] // 3600 - 1
+    missing_count = int(gap_hours.sum())
+    missing_samples = np.empty(min(missing_count, SAMPLE_LIMIT), dtype='datetime64[s]')
+    filled = 0
+    for i, hours in zip(gap_idx, gap_hours):
+        if filled >= len(missing_samples):
+            break
+        count = min(hours, len(missing_samples) - filled)
+        missing_samples[filled:filled + count] = times[i] + np.arange(1, count + 1) * np.timedelta64(3600, 's')
+        filled += count
+
+    if len(dup_idx) or missing_count or len(back_idx):
+        errors = []
+        if len(dup_idx):
+            errors.append(f"发现重复的时间点，共 {len(dup_idx)} 个: {', '.join(format_times(duplicates))} "
+                          f"{'...' if len(dup_idx) > len(duplicates) else ''}")
+        if missing_count:
+            errors.append(f"发现缺失的时间点，共 {missing_count} 个: {', '.join(format_times(missing_samples))} "
+                          f"{'...' if missing_count > len(missing_samples) else ''}")
+        if len(back_idx):
+            errors.append(f"发现时间倒序的数据，共 {len(back_idx)} 条: "
+                          f"{', '.join(format_times(out_of_order))}（可使用 --sort 先排序）")
         return False, '\n'.join(errors)
     else:
+        if watermark_path is not None:
+            write_watermark(watermark_path, times[-1])
         return True, "所有K线数据的open_time严格按照每小时递增，且无重复或缺失。"
 
-def main():
-    file_path = './tmp/DOGEUSDT_historical_10y_klines.json'  # JSON文件路径
-    print(f"正在加载文件: {file_path}...")
-    klines = load_klines(file_path)
+def validate_file(file_path, sort=False, incremental=False, verbose=False):
+    """
+    加载并验证单个K线文件。文件无法读取或解析时返回验证失败，且不会更新水位线。
 
-    if not klines:
-        return
+    :param file_path: JSON文件路径
+    :param sort: 验证前是否先按open_time排序
+    :param incremental: 是否基于水位线文件增量验证
+    :param verbose: 是否打印各个步骤
+    :return: 验证结果及详细信息
+    """
+    if verbose:
+        print(f"正在加载文件: {file_path}...")
+    try:
+        klines = load_klines(file_path)
+        if sort:
+            if verbose:
+                print("正在排序K线数据...")
+            klines = sort_klines(list(klines))
+        if verbose:
+            print("正在验证K线数据的时间序列...")
+        return validate_klines(klines, watermark_path(file_path) if incremental else None)
+    except FileNotFoundError:
+        return False, f"文件 {file_path} 未找到。"
+    except ijson.JSONError as e:
+        # yajl 的错误信息后面附带多行位置示意，只保留第一行
+        return False, f"文件 {file_path} 不是有效的JSON格式: {str(e).splitlines()[0] if str(e) else type(e).__name__}"
 
-    print("正在排序K线数据...")
-    sorted_klines = sort_klines(klines)
+def watermark_path(file_path):
+    """
+    :param file_path: JSON文件路径
+    :return: 该文件对应的水位线文件路径
+    """
+    return file_path + '.watermark'
 
-    print("正在验证K线数据的时间序列...")
-    is_valid, message = validate_klines(sorted_klines)
+def print_result(is_valid, message):
+    """
+    打印验证结果。
 
+    :param is_valid: 是否验证通过
+    :param message: 详细信息
+    """
     if is_valid:
         print("验证通过：所有K线数据的open_time严格按照每小时递增，且无重复或缺失。")
     else:
         print("验证失败：")
         print(message)
 
+def main():
+    parser = argparse.ArgumentParser(description='验证K线数据的open_time是否严格按每小时递增')
+    parser.add_argument('file_paths', nargs='*', default=['./tmp/DOGEUSDT_historical_10y_klines.json'],
+                        help='K线 JSON 文件路径，可指定多个')
+    parser.add_argument('--sort', action='store_true',
+                        help='验证前先按open_time排序（需要将全部数据载入内存，默认流式读取并假定已排序）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='只验证上次验证通过之后新增的数据（水位线记录在 <文件>.watermark 中，适用于只在末尾追加的数据文件）')
+    args = parser.parse_args()
+
+    if len(args.file_paths) == 1:
+        print_result(*validate_file(args.file_paths[0], args.sort, args.incremental, verbose=True))
+        return
+
+    # 多个文件相互独立，使用线程池并行验证（扫描内核不持有 GIL），结果按输入顺序输出
+    print(f"正在并行验证 {len(args.file_paths)} 个文件...")
+    with ThreadPoolExecutor(max_workers=min(len(args.file_paths), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(validate_file, args.file_paths, [args.sort] * len(args.file_paths),
+                                    [args.incremental] * len(args.file_paths)))
+    for file_path, (is_valid, message) in zip(args.file_paths, results):
+        print(f"\n{file_path}:")
+        print_result(is_valid, message)
+
 if __name__ == "__main__":
     main()